@@ -4,16 +4,18 @@ macro_signal_pro.py
 Refined Macro Signal for Gold (Production Ready - v2.1):
 - Fixed: Silences YFinance FutureWarning
 - Fixed: Prints VIX status in console log
-- Dependencies: curl_cffi, yfinance, pandas
+- Dependencies: curl_cffi, yfinance, pandas, numpy
 """
 from curl_cffi import requests as curl_requests
 import yfinance as yf
-import pandas as pd
+import numpy as np
 import os
+import functools
 from datetime import datetime, timezone
 
 # ---------------- CONFIG ----------------
 OUTPUT = "macro_signal.csv"
+FRESH_SECONDS = 900  # Outside the danger window, skip runs if the last signal is newer than this
 
 TICKERS = {
     "GOLD": "GC=F",    # Gold Futures
@@ -23,72 +25,119 @@ TICKERS = {
     "BONDS": "TIP"     # Bond ETF
 }
 
+# Change-based drivers: (ticker key, signal name, threshold, direction for gold)
+CHANGE_SIGNALS = (
+    ("GOLD",  "gold_bias",      0.002,  1),  # Gold momentum
+    ("YIELD", "yield_pressure", 0.015, -1),  # Rising yields are bearish for gold
+    ("DXY",   "dxy_signal",     0.002, -1),  # Rising dollar is bearish for gold
+)
+VIX_THRESHOLD = 18
+
+_TICKER_LIST = list(TICKERS.values())
+_SIGNAL_NAMES = tuple(name for _, name, _, _ in CHANGE_SIGNALS)
+_SIGNAL_COLS = np.array([_TICKER_LIST.index(TICKERS[key]) for key, _, _, _ in CHANGE_SIGNALS])
+_THRESHOLDS = np.array([th for _, _, th, _ in CHANGE_SIGNALS], dtype=np.float64)
+_DIRECTIONS = np.array([d for _, _, _, d in CHANGE_SIGNALS])
+_VIX_COL = _TICKER_LIST.index(TICKERS["VIX"])
+
 # ---------------- HELPERS ----------------
 
+_CFFI = None
+
 def get_cffi_session():
-    """Creates a browser-impersonating session to bypass Yahoo blocking."""
-    return curl_requests.Session(impersonate="chrome")
+    """Returns a shared browser-impersonating session to bypass Yahoo blocking."""
+    global _CFFI
+    if _CFFI is None:
+        _CFFI = curl_requests.Session(impersonate="chrome")
+    return _CFFI
 
-def is_high_impact_window():
+def is_high_impact_window(now_utc=None):
     """Returns 1 if we are in the US Session Morning 'Danger Zone'."""
-    now_utc = datetime.now(timezone.utc)
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
+    return _high_impact_for_hour(now_utc.replace(minute=0, second=0, microsecond=0))
+
+@functools.lru_cache(maxsize=1)
+def _high_impact_for_hour(hour_bucket):
     # 12:00 UTC to 15:00 UTC (approx 8am - 11am NY Time)
-    if 12 <= now_utc.hour <= 15:
+    if 12 <= hour_bucket.hour <= 15:
         return 1 
     return 0
 
-def get_market_regime(lookback_days=5):
-    session = get_cffi_session()
+def last_signal_status(now_utc):
+    """Returns (age in seconds, stored high_impact flag) for the row in OUTPUT, or (None, None) if there is no real signal."""
+    # Use the written timestamp, not the file mtime (a fresh checkout resets mtimes)
     try:
-        # Added auto_adjust=True to silence FutureWarning
-        ticker_list = list(TICKERS.values())
-        data = yf.download(ticker_list, period=f"{lookback_days}d", progress=False, session=session, auto_adjust=True)['Close']
-        
-        if data.empty or len(data) < 2:
-            return None
-            
-        signals = {}
-
-        # 1. GOLD MOMENTUM
-        gold_price = data[TICKERS["GOLD"]]
-        gold_change = (gold_price.iloc[-1] - gold_price.iloc[0]) / gold_price.iloc[0]
-        signals['gold_bias'] = 1 if gold_change > 0.002 else (-1 if gold_change < -0.002 else 0)
-
-        # 2. YIELD SIGNAL (Inverse to Gold)
-        yield_price = data[TICKERS["YIELD"]]
-        yield_change = (yield_price.iloc[-1] - yield_price.iloc[0]) / yield_price.iloc[0]
-        
-        if yield_change > 0.015:    signals['yield_pressure'] = -1 # Bearish for Gold
-        elif yield_change < -0.015: signals['yield_pressure'] = 1  # Bullish for Gold
-        else:                       signals['yield_pressure'] = 0
+        with open(OUTPUT) as f:
+            f.readline()
+            fields = f.readline().strip().split(",")
+        # The fallback row after a failed fetch is short (no high_impact column); don't trust it
+        if len(fields) < 7:
+            return None, None
+        written = datetime.strptime(fields[0], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    except (OSError, ValueError):
+        return None, None
+    return (now_utc - written).total_seconds(), fields[6]
+
+def get_market_regime(lookback_days=5, now_utc=None):
+    """Returns the signal dict, reusing any fetch made in the same 5-minute bucket."""
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
+    bucket = now_utc.replace(minute=now_utc.minute // 5 * 5, second=0, microsecond=0)
+    try:
+        # Copy so callers can't modify the cached value
+        return dict(_market_regime_for_bucket(lookback_days, bucket))
+    except Exception as e:
+        print(f"[Error] Fetch failed: {e}")
+        return None
 
-        # 3. DXY SIGNAL
-        dxy_price = data[TICKERS["DXY"]]
-        dxy_change = (dxy_price.iloc[-1] - dxy_price.iloc[0]) / dxy_price.iloc[0]
-        signals['dxy_signal'] = -1 if dxy_change > 0.002 else (1 if dxy_change < -0.002 else 0)
+@functools.lru_cache(maxsize=4)
+def _market_regime_for_bucket(lookback_days, bucket):
+    # Raises on failure instead of returning None, so lru_cache only keeps successful fetches
+    session = get_cffi_session()
+    # Added auto_adjust=True to silence FutureWarning
+    # Daily bars are enough (only first/last Close are used); threads=False keeps it to one connection
+    data = yf.download(_TICKER_LIST, period=f"{lookback_days}d", interval="1d", threads=False,
+                       progress=False, session=session, auto_adjust=True)['Close']
+    
+    if data.empty or len(data) < 2:
+        raise ValueError("not enough price history returned")
+        
+    # One NumPy pass over first/last closes instead of per-column iloc lookups
+    prices = data[_TICKER_LIST].to_numpy(dtype=np.float64, copy=False)
+    first, last = prices[0], prices[-1]
+    changes = (last - first) / first
 
-        # 4. VIX SIGNAL (Added to print output below)
-        vix_price = data[TICKERS["VIX"]]
-        vix_now = vix_price.iloc[-1]
-        signals['vix_signal'] = 1 if vix_now > 18 else 0
+    # 1-3. GOLD / YIELD / DXY: +1 above threshold, -1 below -threshold, flipped for inverse drivers
+    moves = changes[_SIGNAL_COLS]
+    raw = (moves > _THRESHOLDS).astype(int) - (moves < -_THRESHOLDS).astype(int)
+    signals = dict(zip(_SIGNAL_NAMES, (raw * _DIRECTIONS).tolist()))
 
-        return signals
+    # 4. VIX SIGNAL (Added to print output below)
+    signals['vix_signal'] = 1 if last[_VIX_COL] > VIX_THRESHOLD else 0
 
-    except Exception as e:
-        print(f"[Error] Fetch failed: {e}")
-        return None
+    return signals
 
 # ---------------- MAIN ----------------
 def main():
-    regime = get_market_regime()
-    ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    now_utc = datetime.now(timezone.utc)
+    high_impact = is_high_impact_window(now_utc)
+
+    if os.environ.get("FORCE_REFRESH") != "1" and high_impact == 0:
+        age, stored_high_impact = last_signal_status(now_utc)
+        # Only skip if the stored danger flag is still current (it flips to 0 when the window closes)
+        if age is not None and age < FRESH_SECONDS and stored_high_impact == "0":
+            print("[skip] recent signal fresh")
+            return
+
+    regime = get_market_regime(now_utc=now_utc)
+    ts = now_utc.strftime("%Y-%m-%d %H:%M:%S")
     
     if regime is None:
         # Fallback
         row = [ts, "0", "0", "0", "0", "0"]
     else:
         total_score = regime['gold_bias'] + regime['yield_pressure'] + regime['dxy_signal'] + regime['vix_signal']
-        high_impact = is_high_impact_window()
         
         row = [
             ts, 
@@ -105,12 +154,18 @@ def main():
         print(f"Drivers:       Gold({regime['gold_bias']}) Yields({regime['yield_pressure']}) DXY({regime['dxy_signal']}) VIX({regime['vix_signal']})")
         print(f"News Window:   {'DANGER (1)' if high_impact else 'SAFE (0)'}")
 
-    # Write CSV
+    # Write CSV (single write to a temp file, then atomic rename so readers never see a partial file)
     try:
-        with open(OUTPUT, "w", newline="") as f:
-            header = "timestamp,total_score,gold_bias,yield_pressure,dxy_signal,vix_signal,high_impact\n"
-            f.write(header)
-            f.write(",".join(row) + "\n")
+        header = "timestamp,total_score,gold_bias,yield_pressure,dxy_signal,vix_signal,high_impact\n"
+        payload = (header + ",".join(row) + "\n").encode("utf-8")
+        tmp_path = OUTPUT + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, payload)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, OUTPUT)
         print(f"[Success] Wrote signal to {OUTPUT}")
     except Exception as e:
         print(f"[Error] Write failed: {e}")
@@ -1,15 +1,30 @@
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
+import csv
+from bisect import bisect_left
+import functools
+import json
+from operator import itemgetter
 from datetime import datetime, timedelta, timezone
 import os
-import xml.etree.ElementTree as ET
+from lxml import etree as ET
 
 # --- CONFIG ---
 RSS_URL = "https://nfs.faireconomy.media/ff_calendar_thisweek.xml"
 COUNTRIES = "USD"
 CSV_PATH = "news_calendar.csv"
+# ETag/Last-Modified + parsed events from the last fetch. Untracked; in CI it is carried
+# between runs by the actions/cache step in update_news.yml.
+FEED_CACHE_PATH = ".news_calendar.meta.json"
 SKIP_DAYS = {5, 6}  # Saturday, Sunday
 MIN_REQUEST_HOUR = 2
+FRESH_SECONDS = 300  # Skip the run entirely if the feed was checked more recently than this
+FEED_DATETIME_FORMAT = "%m-%d-%Y %I:%M%p"  # e.g. "10-16-2025 8:30am" (%p matches am/pm case-insensitively)
+USER_AGENT = "Mozilla/5.0 (compatible; gold-news-feed/1.0)"
+
+_UTC = timezone.utc
 
 # Event duration buffer in minutes (how long to keep event as "current")
 EVENT_DURATION_MINUTES = 30  # Adjust based on typical news event duration
@@ -28,22 +43,78 @@ US_HOLIDAYS_2025 = {
     "2025-12-25": "Christmas Day"
 }
 
+# Parsed once at import: (date, name, "YYYY-MM-DD 00:00") sorted by date
+_HOLIDAY_DATES = sorted(
+    (datetime.strptime(date_str, "%Y-%m-%d").date(), name, f"{date_str} 00:00")
+    for date_str, name in US_HOLIDAYS_2025.items()
+)
+
+# lxml parse options for the flat feed: no ID table, entity expansion, whitespace, comments or PIs
+_PARSE_OPTIONS = dict(collect_ids=False, resolve_entities=False, huge_tree=False,
+                      remove_blank_text=True, remove_comments=True, remove_pis=True)
+
+# Compiled once at import; called on each streamed <event> as a single compiled per-element check
+_IS_RELEVANT_EVENT = ET.XPath("country = $country and (impact = 'High' or impact = 'Moderate')")
+
+# --- HTTP SESSION ---
+_SESSION = None
+
+def get_session():
+    """Returns a shared pooled session so repeated requests reuse connections."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        # Retry transient failures with backoff instead of losing the whole update.
+        # Ignore Retry-After so a rate-limited response can't stall the job for hours.
+        retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET"]), respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        _SESSION.mount("http://", adapter)
+        _SESSION.mount("https://", adapter)
+        # Ask for a compressed feed explicitly; urllib3 decodes it transparently
+        _SESSION.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"})
+    return _SESSION
+
 # --- FETCH HOLIDAYS ---
-def get_upcoming_holidays():
-    """Returns upcoming US bank holidays as events"""
-    today = datetime.now(timezone.utc).date()
-    holiday_events = []
-    
-    for date_str, name in US_HOLIDAYS_2025.items():
-        holiday_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        
-        # Only include future holidays or today
-        if holiday_date >= today:
-            # Set time to midnight for all-day events
-            dt_str = f"{date_str} 00:00"
-            holiday_events.append([dt_str, "High", "USD", f"🏦 US Bank Holiday: {name}"])
+def get_upcoming_holidays(today=None):
+    """Returns upcoming US bank holidays (today or later) as all-day events"""
+    if today is None:
+        today = datetime.now(_UTC).date()
+    idx = bisect_left(_HOLIDAY_DATES, (today,))
+    return [[dt_str, "High", "USD", f"🏦 US Bank Holiday: {name}"] for _, name, dt_str in _HOLIDAY_DATES[idx:]]
+
+# --- FEED CACHE ---
+def load_feed_cache():
+    """Returns the validators and events saved by the last successful fetch, or {}."""
+    try:
+        with open(FEED_CACHE_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) and "events" in cache else {}
+
+def save_feed_cache(etag, last_modified, events):
+    """Persists the response validators alongside the events parsed from it."""
+    try:
+        with open(FEED_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "events": events}, f)
+    except OSError as e:
+        print(f"⚠️ Could not save feed cache: {e}")
+
+# --- PARSE FEED TIMES ---
+@functools.lru_cache(maxsize=None)
+def parse_feed_datetime(date_str, time_str):
+    """
+    Converts a feed date ("10-16-2025") and time ("8:30am") to "YYYY-MM-DD HH:MM".
     
-    return holiday_events
+    Memoized: releases cluster on a handful of slots (e.g. 8:30am), so each
+    distinct pair is only parsed once per run.
+    """
+    dt_obj_naive = datetime.strptime(f"{date_str} {time_str.strip()}", FEED_DATETIME_FORMAT)
+    dt_obj_utc = dt_obj_naive.replace(tzinfo=_UTC)
+    # Fixed-width %-formatting is cheaper than strftime's locale-aware path
+    return "%04d-%02d-%02d %02d:%02d" % (dt_obj_utc.year, dt_obj_utc.month, dt_obj_utc.day,
+                                         dt_obj_utc.hour, dt_obj_utc.minute)
 
 # --- FETCH NEWS DATA ---
 def fetch_news():
@@ -51,96 +122,141 @@ def fetch_news():
     
     print(f"🔹 Fetching news from {RSS_URL}")
     
+    # Conditional GET: if the feed hasn't changed, skip the download and the parse
+    cache = load_feed_cache()
+    headers = {}
+    if cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+    
     try:
-        r = requests.get(RSS_URL, timeout=20)
+        r = get_session().get(RSS_URL, headers=headers, timeout=20, stream=True)
         r.raise_for_status()
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching URL: {e}")
         return []
 
-    root = ET.fromstring(r.content)
+    if r.status_code == 304:
+        r.close()
+        os.utime(FEED_CACHE_PATH)  # record the check for the freshness gate
+        print("♻️ Feed unchanged (304), reusing cached events")
+        return cache["events"]
+
+    # Parse incrementally from the socket instead of building the whole tree
+    r.raw.decode_content = True  # let urllib3 undo gzip/deflate before lxml sees the bytes
     events = []
     
-    for event_tag in root.findall('event'):
-        try:
-            title = event_tag.find('title').text if event_tag.find('title') is not None else ""
-            country = event_tag.find('country').text if event_tag.find('country') is not None else ""
-            date_str = event_tag.find('date').text if event_tag.find('date') is not None else ""
-            time_str = event_tag.find('time').text if event_tag.find('time') is not None else ""
-            impact = event_tag.find('impact').text if event_tag.find('impact') is not None else ""
-            
-            if date_str and time_str:
-                time_str = time_str.replace("am", " AM").replace("pm", " PM").strip()
-                dt_obj_naive = datetime.strptime(f"{date_str} {time_str}", "%m-%d-%Y %I:%M %p")
-                dt_obj_utc = dt_obj_naive.replace(tzinfo=timezone.utc)
-                date_time = dt_obj_utc.strftime("%Y-%m-%d %H:%M")
-            else:
-                date_time = ""
-
-            # Filter for USD and High/Moderate Impact
-            if country == COUNTRIES and (impact == "High" or impact == "Moderate"):
-                events.append([date_time, impact, country, title])
-
-        except Exception as e:
-            print(f"⚠️ Parse error for an event: {e}")
+    try:
+        for _, event_tag in ET.iterparse(r.raw, events=("end",), tag="event", **_PARSE_OPTIONS):
+            try:
+                # Filter for USD and High/Moderate Impact before reading any fields
+                if not _IS_RELEVANT_EVENT(event_tag, country=COUNTRIES):
+                    continue
+                
+                # Read all child fields in one pass instead of a lookup per field
+                fields = {child.tag: child.text for child in event_tag}
+                title = fields.get('title') or ""
+                date_str = fields.get('date') or ""
+                time_str = fields.get('time') or ""
+                
+                if date_str and time_str:
+                    date_time = parse_feed_datetime(date_str, time_str)
+                else:
+                    date_time = ""
+
+                # Country and impact were matched by the predicate above
+                events.append([date_time, fields['impact'], COUNTRIES, title])
+
+            except Exception as e:
+                print(f"⚠️ Parse error for an event: {e}")
+
+            finally:
+                # Free the processed event and any earlier siblings still held by the root
+                event_tag.clear()
+                while event_tag.getprevious() is not None:
+                    del event_tag.getparent()[0]
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, ET.XMLSyntaxError) as e:
+        # The body is read while parsing, so a dropped or stalled connection surfaces here.
+        # Don't cache a partial parse under a valid ETag.
+        print(f"❌ Error fetching URL: {e}")
+        return []
+    finally:
+        r.close()
+    
+    save_feed_cache(r.headers.get("ETag"), r.headers.get("Last-Modified"), events)
             
     return events
 
 # --- FILTER FUTURE EVENTS ---
-def filter_future_events(events):
+def filter_future_events(events, now):
     """
     Filters events to keep only future or currently happening events.
     
     Logic:
     - For regular news events: keep if event_time + duration >= current_time
     - For bank holidays: keep if event_date >= current_date
+    (current time is `now`, the caller's UTC timestamp)
+    
+    Rows carry zero-padded "YYYY-MM-DD HH:MM" UTC strings, which sort the same
+    as the times they encode, so each row is compared against precomputed
+    cutoff strings instead of being re-parsed.
     """
-    now = datetime.now(timezone.utc)
+    
+    # Earliest start time whose event hasn't finished yet, rounded up to the next whole minute
+    news_cutoff = now - timedelta(minutes=EVENT_DURATION_MINUTES)
+    if news_cutoff.second or news_cutoff.microsecond:
+        news_cutoff += timedelta(minutes=1)
+    news_cutoff_str = news_cutoff.strftime("%Y-%m-%d %H:%M")
+    holiday_cutoff_str = now.strftime("%Y-%m-%d")
+    
     filtered_events = []
     removed_count = 0
     
     for event in events:
-        try:
-            event_datetime_str = event[0]
-            title = event[3]
-            
-            # Parse event datetime
-            event_dt = datetime.strptime(event_datetime_str, "%Y-%m-%d %H:%M")
-            event_dt = event_dt.replace(tzinfo=timezone.utc)
-            
-            # Check if it's a bank holiday (all-day event)
-            is_holiday = "🏦" in title
-            
-            if is_holiday:
-                # For holidays, keep if the date is today or future
-                if event_dt.date() >= now.date():
-                    filtered_events.append(event)
-                else:
-                    removed_count += 1
-            else:
-                # For news events, add duration buffer
-                event_end_time = event_dt + timedelta(minutes=EVENT_DURATION_MINUTES)
-                
-                # Keep if event hasn't finished yet
-                if event_end_time >= now:
-                    filtered_events.append(event)
-                else:
-                    removed_count += 1
-                    
-        except Exception as e:
-            print(f"⚠️ Error filtering event: {e}")
-            # Keep event if parsing fails (safety fallback)
+        event_datetime_str = event[0]
+        
+        if len(event_datetime_str) != 16:
+            print(f"⚠️ Error filtering event: unexpected datetime '{event_datetime_str}'")
+            # Keep event if the datetime is malformed (safety fallback)
+            filtered_events.append(event)
+            continue
+        
+        # Bank holidays (all-day events) are kept for the whole day; news events until they finish
+        cutoff = holiday_cutoff_str if event[3].startswith("🏦") else news_cutoff_str
+        
+        if event_datetime_str >= cutoff:
             filtered_events.append(event)
+        else:
+            removed_count += 1
     
     if removed_count > 0:
         print(f"🗑️ Removed {removed_count} past events")
     
     return filtered_events
 
+# --- WRITE CSV ---
+def write_calendar_csv(rows):
+    """Writes rows (no header) to CSV_PATH; an empty list clears the file."""
+    with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f, lineterminator="\n").writerows(rows)
+
 # --- UPDATE CSV ---
 def update_news_calendar():
     """Checks conditions, fetches news + holidays, filters past events, and saves the CSV."""
-    now = datetime.now(timezone.utc)
+    now = datetime.now(_UTC)
+
+    # 🛑 Skip if the feed was checked moments ago. This is the feed cache's mtime (touched on
+    # every 200/304), not the CSV's, since a fresh checkout resets tracked mtimes. In CI the
+    # cache is restored by actions/cache, so this only fires for runs close to the previous one
+    # (e.g. a manual dispatch right after a scheduled run); the 6-hour schedule always passes.
+    try:
+        age = now.timestamp() - os.path.getmtime(FEED_CACHE_PATH)
+        if age < FRESH_SECONDS and os.path.exists(CSV_PATH):
+            print(f"⏸️ Feed checked {int(age)}s ago, skipping")
+            return
+    except FileNotFoundError:
+        pass
 
     # 🛑 Skip weekends
     if now.weekday() in SKIP_DAYS:
@@ -152,43 +268,41 @@ def update_news_calendar():
         print(f"⏸️ Before {MIN_REQUEST_HOUR}:00 UTC, no update needed.")
         return
 
-    # ✅ Fetch news events
-    events = fetch_news()
-    
-    # ✅ Add bank holidays
-    holiday_events = get_upcoming_holidays()
-    events.extend(holiday_events)
+    # ✅ Fetch news events and add bank holidays, dropping duplicates (in case of any overlap) as we go
+    events = []
+    seen = set()
+    for event in fetch_news() + get_upcoming_holidays(now.date()):
+        key = (event[0], event[3])
+        if key in seen:
+            continue
+        seen.add(key)
+        events.append(event)
     
     if not events:
         print("⚠️ No relevant events returned from feed.")
         return
     
     # ✅ Filter out past events
-    events = filter_future_events(events)
+    events = filter_future_events(events, now)
     
     if not events:
         print("⚠️ No future events remaining after filtering.")
         # Create empty CSV to clear old data
-        pd.DataFrame(columns=["datetime", "impact", "currency", "title"]).to_csv(CSV_PATH, index=False, header=False)
+        write_calendar_csv([])
         print(f"✅ Created empty {CSV_PATH}")
         return
 
-    df = pd.DataFrame(events, columns=["datetime", "impact", "currency", "title"])
-    df = df.sort_values("datetime")
-    
-    # Remove duplicates (in case of any overlap)
-    df = df.drop_duplicates(subset=["datetime", "title"])
-    
-    df.to_csv(CSV_PATH, index=False, header=False)
+    events.sort(key=itemgetter(0))
+    write_calendar_csv(events)
     
     # Count news vs holidays
-    news_count = len([e for e in events if "🏦" not in e[3]])
-    holiday_count = len([e for e in events if "🏦" in e[3]])
+    holiday_count = sum(1 for e in events if e[3].startswith("🏦"))
+    news_count = len(events) - holiday_count
     
     print(f"✅ Updated {CSV_PATH} with:")
     print(f"   📰 {news_count} High/Moderate {COUNTRIES} news events")
     print(f"   🏦 {holiday_count} US bank holidays")
-    print(f"   📊 {len(df)} total upcoming events")
+    print(f"   📊 {len(events)} total upcoming events")
     print(f"   ⏰ Current UTC time: {now.strftime('%Y-%m-%d %H:%M:%S')}")
 
 if __name__ == "__main__":